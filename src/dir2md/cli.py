@@ -1,12 +1,28 @@
 import argparse
+import codecs
+import errno
+import os
+import re
+import shutil
 import sys
+import tempfile
+from collections import deque
 from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from fnmatch import fnmatch
+from fnmatch import translate
 from pathlib import Path
-from typing import Final, TextIO
+from typing import BinaryIO, Final
 import time
 
+try:
+    # Optional: google-re2 (pip install 'dir2md[re2]').
+    import re2
+    _re2_options = re2.Options()
+    _re2_options.log_errors = False
+except (ImportError, AttributeError):
+    re2 = None
+
 DEFAULT_EXCLUDES: Final[set[str]] = {'.git', 'node_modules', '.venv', 'venv', '__pycache__', 'dist', 'build'}
 DEFAULT_BINARY_EXTS: Final[set[str]] = {
     '.png','.jpg','.jpeg','.gif','.webp','.bmp','.tif','.tiff','.ico',
@@ -15,6 +31,18 @@ DEFAULT_BINARY_EXTS: Final[set[str]] = {
     '.bin','.dat','.psd','.ai','.eps'
 }
 
+CONN_MID: Final[str] = '├── '
+CONN_LAST: Final[str] = '└── '
+PAD_MID: Final[str] = '│   '
+PAD_LAST: Final[str] = '    '
+
+SNIFF_BYTES: Final[int] = 1024
+OUTPUT_BUFFER: Final[int] = 1 << 20
+DECODE_CHUNK: Final[int] = 1 << 16
+SUFFIX_CACHE_SIZE: Final[int] = 4096
+MAX_PENDING_READS: Final[int] = 256
+SENDFILE_UNSUPPORTED: Final[frozenset[int]] = frozenset({errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP})
+
 LANG_MAP: Final[dict[str, str]] = {
     '.py':'python', '.ts':'typescript', '.js':'javascript', '.tsx':'tsx', '.jsx':'jsx',
     '.json':'json', '.md':'markdown', '.yml':'yaml', '.yaml':'yaml',
@@ -26,12 +54,26 @@ LANG_MAP: Final[dict[str, str]] = {
     '.php':'php', '.pl':'perl', '.swift':'swift', '.cs':'csharp', '.sql':'sql'
 }
 
-def detect_lang(path: Path) -> str:
-    if path.name == 'Dockerfile':
-        return 'dockerfile'
-    if path.name == 'Makefile':
-        return 'make'
-    return LANG_MAP.get(path.suffix.lower(), '')
+SPECIAL_NAMES: Final[dict[str, str]] = {'Dockerfile': 'dockerfile', 'Makefile': 'make'}
+
+_suffix_cache: dict[str, str] = {}
+
+def file_ext(name: str) -> str:
+    """Return the lower-cased extension of name, interned.
+
+    Most files in a tree share a handful of extensions, so the lower-casing is
+    cached per raw suffix and set lookups hit CPython's identity fast path.
+    """
+    suffix: str = os.path.splitext(name)[1]
+    ext: str | None = _suffix_cache.get(suffix)
+    if ext is None:
+        if len(_suffix_cache) >= SUFFIX_CACHE_SIZE:
+            _suffix_cache.clear()
+        ext = _suffix_cache[suffix] = sys.intern(suffix.lower())
+    return ext
+
+def detect_lang(name: str) -> str:
+    return SPECIAL_NAMES.get(name) or LANG_MAP.get(file_ext(name), '')
 
 def normalise_exts(exts: Iterable[str] | None) -> set[str]:
     if not exts:
@@ -43,31 +85,48 @@ def normalise_exts(exts: Iterable[str] | None) -> set[str]:
             continue
         if not e.startswith('.'):
             e = '.' + e
-        out.add(e.lower())
+        out.add(sys.intern(e.lower()))
     return out
 
-def looks_binary(p: Path) -> bool:
-    try:
-        with p.open('rb') as rf:
-            chunk = rf.read(8192)
-        return b'\0' in chunk
-    except Exception:
-        return True
+def looks_binary(data: bytes) -> bool:
+    # A NUL in the leading bytes gives away nearly every binary format.
+    return data.find(b'\0', 0, SNIFF_BYTES) != -1
 
-def matches_any_pattern(rel_path: str, patterns: list[str]) -> bool:
-    """Check if relative path matches any of the given glob patterns."""
-    for pattern in patterns:
-        if fnmatch(rel_path, pattern):
-            return True
-    return False
+def compile_patterns(patterns: list[str] | None) -> re.Pattern[str] | None:
+    """Translate glob patterns into a single alternation regex, compiled once.
+
+    Uses RE2 (linear-time, no backtracking) when the optional google-re2
+    package is installed and can express every pattern, else the stdlib re.
+    """
+    if not patterns:
+        return None
+    globs: list[str] = [os.path.normcase(p) for p in patterns]
+    translated: list[str] = [translate(g) for g in globs]
+    if re2 is not None:
+        # RE2 never backtracks, so the atomic groups fnmatch emits to stop
+        # backtracking blow-ups can be plain groups; globs with a character
+        # class are left as-is since '(?>' may be literal inside one. RE2
+        # spells the end anchor \z. Anything it still cannot parse (e.g. the
+        # lookahead form older Pythons emit) falls back to re.
+        re2_translated: list[str] = [
+            (rx if '[' in g else rx.replace('(?>', '(?:')).removesuffix(r'\Z') + r'\z'
+            for g, rx in zip(globs, translated)
+        ]
+        try:
+            return re2.compile('|'.join(f'(?:{rx})' for rx in re2_translated), _re2_options)
+        except re2.error:
+            pass
+    return re.compile('|'.join(f'(?:{rx})' for rx in translated))
 
-def file_passes_time_filter(p: Path, modified_cutoff: float | None, created_cutoff: float | None) -> bool:
+def matches_any_pattern(rel_path: str, patterns: re.Pattern[str]) -> bool:
+    """Check if relative path matches any of the glob patterns compiled into patterns."""
+    return patterns.match(os.path.normcase(rel_path)) is not None
+
+def file_passes_time_filter(stat: os.stat_result, modified_cutoff: float | None, created_cutoff: float | None) -> bool:
     """Check if file passes the time-based filters."""
     if modified_cutoff is None and created_cutoff is None:
         return True
     
-    stat = p.stat()
-    
     if modified_cutoff is not None and stat.st_mtime >= modified_cutoff:
         return True
     
@@ -80,49 +139,98 @@ def file_passes_time_filter(p: Path, modified_cutoff: float | None, created_cuto
     # If either filter was specified but neither passed, exclude the file
     return False
 
-def write_output(f: TextIO, root: Path, tree_lines: list[str], collected_files: list[Path], max_size: int | None) -> None:
-    """Write the markdown output to the given file handle."""
-    now_str: str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def read_file(e: os.DirEntry[str], rel: str, max_size: int | None) -> tuple[str, str, bytes, bool, int] | None:
+    """Read one file, returning (rel, lang, data, truncated, size).
 
-    f.write(f"# Snapshot of {root.name}\n\n")
-    f.write(f"Generated: {now_str}\n\n")
+    The binary sniff shares the same read; returns None for binary or
+    unreadable files.
+    """
+    # Reading one byte past max_size tells us whether the file is truncated
+    # without consulting its size first.
+    limit: int = -1 if max_size is None else max(max_size + 1, SNIFF_BYTES)
+    try:
+        with open(e.path, 'rb') as rf:
+            data: bytes = rf.read(limit)
+    except OSError:
+        return None
+    if looks_binary(data):
+        return None
+    truncated: bool = max_size is not None and len(data) > max_size
+    size: int = len(data)
+    if truncated:
+        data = data[:max_size]
+        # Only the truncation note needs the full size; DirEntry caches the
+        # stat if the time filter already took it.
+        size = e.stat().st_size
 
-    f.write("## Directory tree\n\n")
-    f.write("```text\n")
-    for line in tree_lines:
-        f.write(line + "\n")
-    f.write("```\n\n")
+    return rel, detect_lang(e.name), data, truncated, size
 
-    f.write("## File contents\n\n")
-    for p in collected_files:
-        rel: str = p.relative_to(root).as_posix()
+def write_header(f: BinaryIO, root: Path, tree_lines: list[str]) -> None:
+    """Write the title and directory tree, UTF-8 encoded, to the given binary file handle."""
+    now_str: str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        size: int = p.stat().st_size
-        truncated: bool = False
+    f.write(''.join((
+        f"# Snapshot of {root.name}\n\n",
+        f"Generated: {now_str}\n\n",
+        "## Directory tree\n\n",
+        "```text\n",
+        '\n'.join(tree_lines),
+        "\n```\n\n",
+        "## File contents\n\n",
+    )).encode('utf-8'))
 
-        if max_size is not None and size > max_size:
-            with p.open('rb') as rf:
-                data: bytes = rf.read(max_size)
-            truncated = True
-        else:
-            with p.open('rb') as rf:
-                data = rf.read()
-        
-        try:
-            text: str = data.decode('utf-8', errors='replace')
-        except Exception:
-            text = data.decode('latin-1', errors='replace')
+def write_file_section(f: BinaryIO, item: tuple[str, str, bytes, bool, int] | None, max_size: int | None) -> None:
+    """Write one read_file() result as a markdown section; None is skipped."""
+    if item is None:
+        return
+    rel, lang, data, truncated, size = item
 
-        lang: str = detect_lang(p)
+    # The section is batched into one write, flushed early past OUTPUT_BUFFER.
+    # Contents are decoded in DECODE_CHUNK slices so a large file is never
+    # held as one str.
+    buf: bytearray = bytearray(''.join(("### ", rel, "\n\n```", lang, "\n")).encode('utf-8'))
+    decode = codecs.getincrementaldecoder('utf-8')(errors='replace').decode
+    view: memoryview = memoryview(data)
+    for start in range(0, len(view), DECODE_CHUNK):
+        buf += decode(view[start:start + DECODE_CHUNK]).encode('utf-8')
+        if len(buf) >= OUTPUT_BUFFER:
+            f.write(buf)
+            buf.clear()
+    buf += decode(b'', True).encode('utf-8')
+    if not data.endswith(b"\n"):
+        buf += b"\n"
+    buf += b"```\n\n"
+    if truncated:
+        buf += f"> Note: truncated to {max_size} bytes from {size} bytes.\n\n".encode('utf-8')
+    f.write(buf)
 
-        f.write(f"### {rel}\n\n")
-        f.write(f"```{lang}\n")
-        f.write(text)
-        if not text.endswith('\n'):
-            f.write("\n")
-        f.write("```\n\n")
-        if truncated:
-            f.write(f"> Note: truncated to {max_size} bytes from {size} bytes.\n\n")
+def copy_contents(src: BinaryIO, dst: BinaryIO) -> None:
+    """Append all of src to dst, via os.sendfile where the platform allows it."""
+    src.seek(0)
+    dst.flush()
+    try:
+        sendfile = os.sendfile
+        in_fd: int = src.fileno()
+        out_fd: int = dst.fileno()
+    except (AttributeError, OSError):
+        # No sendfile (Windows), or streams without a real descriptor.
+        shutil.copyfileobj(src, dst, OUTPUT_BUFFER)
+        return
+
+    offset: int = 0
+    while True:
+        try:
+            sent: int = sendfile(out_fd, in_fd, offset, OUTPUT_BUFFER)
+        except OSError as err:
+            # Fall back only if sendfile cannot target dst at all (e.g. macOS
+            # needs a socket); real write errors such as EPIPE propagate.
+            if offset or err.errno not in SENDFILE_UNSUPPORTED:
+                raise
+            shutil.copyfileobj(src, dst, OUTPUT_BUFFER)
+            return
+        if sent == 0:
+            return
+        offset += sent
 
 def main() -> None:
     parser = argparse.ArgumentParser(
@@ -158,10 +266,10 @@ def main() -> None:
     excludes: set[str] = set(args.exclude or [])
     outfile: Path = root / args.output
 
-    include_exts: set[str] = normalise_exts(args.include_ext)
-    exclude_exts: set[str] = normalise_exts(args.exclude_ext) | set(DEFAULT_BINARY_EXTS)
-    include_patterns: list[str] | None = args.pattern
-    exclude_patterns: list[str] | None = args.exclude_pattern
+    include_exts: frozenset[str] = frozenset(normalise_exts(args.include_ext))
+    exclude_exts: frozenset[str] = frozenset(normalise_exts(args.exclude_ext) | DEFAULT_BINARY_EXTS)
+    include_patterns: re.Pattern[str] | None = compile_patterns(args.pattern)
+    exclude_patterns: re.Pattern[str] | None = compile_patterns(args.exclude_pattern)
 
     # Calculate time cutoffs
     now = time.time()
@@ -172,68 +280,114 @@ def main() -> None:
         modified_cutoff = now - (args.modified_within * 60)
     if args.created_within is not None:
         created_cutoff = now - (args.created_within * 60)
+    time_filtered: bool = modified_cutoff is not None or created_cutoff is not None
+
+    outfile_path: str = str(outfile)
+    to_stdout: bool = args.stdout
+    show_hidden: bool = args.show_hidden
 
-    def is_hidden(p: Path) -> bool:
-        return p.name.startswith('.')
+    def is_hidden(e: os.DirEntry[str]) -> bool:
+        return e.name.startswith('.')
 
-    def skip(e: Path) -> bool:
+    def skip(e: os.DirEntry[str]) -> bool:
         if e.is_symlink():
             return True
-        if not args.stdout and e == outfile:
+        if not to_stdout and e.path == outfile_path:
             return True
-        for part in e.parts:
-            if part in excludes:
-                return True
-        if not args.show_hidden and is_hidden(e) and e != root:
+        # The walk is top-down, so every ancestor has already been checked.
+        if e.name in excludes:
+            return True
+        if not show_hidden and is_hidden(e):
             return True
         return False
 
-    def list_entries(dirp: Path) -> list[Path]:
-        items: list[Path] = []
-        for e in sorted(dirp.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower())):
-            if skip(e):
-                continue
-            items.append(e)
+    def list_entries(dirp: str) -> list[os.DirEntry[str]]:
+        # Filter before sorting so huge excluded listings are never sorted.
+        items: list[os.DirEntry[str]] = []
+        with os.scandir(dirp) as it:
+            for e in it:
+                if not skip(e):
+                    items.append(e)
+        items.sort(key=lambda x: (not x.is_dir(follow_symlinks=False), x.name.lower()))
         return items
 
-    tree_lines: list[str] = []
-    collected_files: list[Path] = []
-
-    def walk(dirp: Path, prefix: str = '') -> None:
-        entries: list[Path] = list_entries(dirp)
-        for i, e in enumerate(entries):
-            is_last: bool = i == len(entries) - 1
-            connector: str = '└── ' if is_last else '├── '
-            if e.is_dir():
-                tree_lines.append(prefix + connector + e.name + '/')
-                walk(e, prefix + ('    ' if is_last else '│   '))
-            else:
-                tree_lines.append(prefix + connector + e.name)
-                ext: str = e.suffix.lower()
-                if include_exts and ext not in include_exts:
-                    continue
-                if ext in exclude_exts:
-                    continue
-                if looks_binary(e):
-                    continue
-                rel_path: str = e.relative_to(root).as_posix()
-                if include_patterns and not matches_any_pattern(rel_path, include_patterns):
-                    continue
-                if exclude_patterns and matches_any_pattern(rel_path, exclude_patterns):
-                    continue
-                if not file_passes_time_filter(e, modified_cutoff, created_cutoff):
-                    continue
-                collected_files.append(e)
-
-    tree_lines.append('.')
-    walk(root)
-
-    if args.stdout:
-        write_output(sys.stdout, root, tree_lines, collected_files, args.max_size)
-    else:
-        with outfile.open('w', encoding='utf-8') as f:
-            write_output(f, root, tree_lines, collected_files, args.max_size)
-        print(f"Wrote {outfile}")
+    def should_include(e: os.DirEntry[str], rel_path: str) -> bool:
+        # File filters run cheapest-first: extension sets, include/exclude
+        # regexes, the stat-based time filter, and finally the binary sniff,
+        # which needs a read and so happens in read_file.
+        ext: str = file_ext(e.name)
+        if include_exts and ext not in include_exts:
+            return False
+        if ext in exclude_exts:
+            return False
+        if include_patterns is not None and not matches_any_pattern(rel_path, include_patterns):
+            return False
+        if exclude_patterns is not None and matches_any_pattern(rel_path, exclude_patterns):
+            return False
+        if time_filtered and not file_passes_time_filter(e.stat(), modified_cutoff, created_cutoff):
+            return False
+        return True
+
+    tree_lines: list[str] = ['.']
+    max_size: int | None = args.max_size
+
+    # File and directory I/O is latency-bound, so it runs on a thread pool
+    # while the walk continues: each child directory is listed as soon as its
+    # parent is, and each file that passes the filters is read as soon as it
+    # is found. Finished reads are written, in walk order, to a temporary
+    # contents file straight away, so at most MAX_PENDING_READS files are
+    # held in memory. The tree is only complete once the walk ends, so the
+    # output gets the header then and the contents are copied in behind it.
+    max_workers: int = min(32, (os.cpu_count() or 1) * 4)
+    with tempfile.TemporaryFile(buffering=OUTPUT_BUFFER) as contents, \
+            ThreadPoolExecutor(max_workers=max_workers) as pool:
+        reads: deque[Future[tuple[str, str, bytes, bool, int] | None]] = deque()
+
+        # Depth-first walk driven by an explicit stack of
+        # (entry, prefix, is_last, rel_dir, listing), where rel_dir is the
+        # entry's parent relative to root in posix form and listing is the
+        # pending list_entries() of a directory entry. Children are pushed in
+        # reverse so they pop in sorted order.
+        stack: list[tuple[os.DirEntry[str], str, bool, str, Future[list[os.DirEntry[str]]] | None]] = []
+
+        def push_children(entries: list[os.DirEntry[str]], prefix: str, rel_dir: str) -> None:
+            listings: list[Future[list[os.DirEntry[str]]] | None] = [
+                pool.submit(list_entries, e.path) if e.is_dir(follow_symlinks=False) else None
+                for e in entries
+            ]
+            last: int = len(entries) - 1
+            for i in range(last, -1, -1):
+                stack.append((entries[i], prefix, i == last, rel_dir, listings[i]))
+
+        push_children(list_entries(str(root)), '', '')
+        while stack:
+            e, prefix, is_last, rel_dir, listing = stack.pop()
+            connector: str = CONN_LAST if is_last else CONN_MID
+            if listing is not None:
+                tree_lines.append(''.join((prefix, connector, e.name, '/')))
+                # Built once per directory; every child shares the same string.
+                push_children(listing.result(), prefix + (PAD_LAST if is_last else PAD_MID), ''.join((rel_dir, e.name, '/')))
+                continue
+            tree_lines.append(''.join((prefix, connector, e.name)))
+            rel_path: str = rel_dir + e.name
+            if not should_include(e, rel_path):
+                continue
+            reads.append(pool.submit(read_file, e, rel_path, max_size))
+            while reads and (reads[0].done() or len(reads) > MAX_PENDING_READS):
+                write_file_section(contents, reads.popleft().result(), max_size)
+
+        while reads:
+            write_file_section(contents, reads.popleft().result(), max_size)
+
+        if to_stdout:
+            write_header(sys.stdout.buffer, root, tree_lines)
+            copy_contents(contents, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            with outfile.open('wb', buffering=OUTPUT_BUFFER) as f:
+                write_header(f, root, tree_lines)
+                copy_contents(contents, f)
+            print(f"Wrote {outfile}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file